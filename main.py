@@ -1,19 +1,50 @@
-import re
-import math
-import asyncio
-import aiohttp
-from io import BytesIO
-from typing import Any, AsyncGenerator, Dict, List, Tuple
-from PIL import Image, ImageFilter
-
-from astrbot.api import logger, AstrBotConfig
-from astrbot.api.event import AstrMessageEvent, filter, MessageChain
-from astrbot.api.star import Star, register, Context
-import astrbot.api.message_components as Comp
-from astrbot.api.message_components import Plain, Node, Nodes
+import time
+
+# 模块导入开始时间，用于统计插件导入耗时（含依赖导入）
+_IMPORT_STARTED = time.perf_counter()
+
+import os  # noqa: E402
+import re  # noqa: E402
+import sys  # noqa: E402
+import json  # noqa: E402
+import math  # noqa: E402
+import asyncio  # noqa: E402
+import itertools  # noqa: E402
+import threading  # noqa: E402
+import traceback  # noqa: E402
+import aiohttp  # noqa: E402
+from collections import OrderedDict  # noqa: E402
+from io import BytesIO  # noqa: E402
+from typing import Any, AsyncGenerator, Dict, Hashable, List, Optional, Tuple  # noqa: E402
+
+from astrbot.api import logger, AstrBotConfig  # noqa: E402
+from astrbot.api.event import AstrMessageEvent, filter, MessageChain  # noqa: E402
+from astrbot.api.star import Star, register, Context  # noqa: E402
+import astrbot.api.message_components as Comp  # noqa: E402
+from astrbot.api.message_components import Plain, Node, Nodes  # noqa: E402
+
+_IMPORT_COST = time.perf_counter() - _IMPORT_STARTED
+# 导入耗时只在本次导入后创建的第一个实例中输出，避免重复实例化时误报
+_IMPORT_REPORTED = False
 
 DEFAULT_WHATSLINK_URL = "https://whatslink.info" 
 DEFAULT_TIMEOUT = 10 
+DEDUP_CACHE_SIZE = 256
+# replay 模式会连同处理后的截图一起缓存，条目上限需更小以控制内存
+DEDUP_REPLAY_CACHE_SIZE = 16
+DEDUP_MODES = ("skip", "reply", "replay")
+WATCHDOG_INTERVAL = 0.05
+# 单次处理超过该时长仍未结束时视为已丢失，防止监测与性能分析一直开启
+PIPELINE_TRACK_TIMEOUT = 300
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PROFILE_SECONDS = 60
+MAX_PROFILE_SECONDS = 600
+PROFILE_TOP_N = 15
+
+MAGNET_REGEX = re.compile(r"magnet:\?xt=urn:btih:([a-zA-Z0-9]{32,40})", re.IGNORECASE)
+COMMAND_REGEX = re.compile(r"text='(.*?)'")
+HASH_REGEX = re.compile(r"\b([a-fA-F0-9]{40})\b", re.IGNORECASE)
+URL_REGEX = re.compile(r"\b(?:https?://|www\.)[^\s<>'\"`]+", re.IGNORECASE)
 
 FILE_TYPE_MAP = {
     'folder': '📁 文件夹',
@@ -26,12 +57,204 @@ FILE_TYPE_MAP = {
     'unknown': '❓ 其他'
 }
 
+# 重依赖按需加载，缩短插件启动与重载耗时
+_PIL_MODULES = None
+_PIL_LOAD_COST = 0.0
+_TELEGRAM_MODULES = None
+_PROFILING_MODULES = None
+
+
+def _load_pil():
+    """首次使用时导入 Pillow，返回 (Image, ImageFilter)"""
+    global _PIL_MODULES, _PIL_LOAD_COST
+    if _PIL_MODULES is None:
+        started = time.perf_counter()
+        from PIL import Image, ImageFilter
+        _PIL_MODULES = (Image, ImageFilter)
+        _PIL_LOAD_COST = time.perf_counter() - started
+    return _PIL_MODULES
+
+
+def _load_telegram():
+    """首次使用时导入 telegram，返回 (InputMediaPhoto, ExtBot)；未安装时返回 None 并缓存该结果"""
+    global _TELEGRAM_MODULES
+    if _TELEGRAM_MODULES is None:
+        try:
+            from telegram import InputMediaPhoto
+            from telegram.ext import ExtBot
+            _TELEGRAM_MODULES = (InputMediaPhoto, ExtBot)
+        except ImportError:
+            _TELEGRAM_MODULES = False
+    return _TELEGRAM_MODULES or None
+
+
+def _load_profiling():
+    """首次使用时导入性能分析模块，返回 (cProfile, pstats)"""
+    global _PROFILING_MODULES
+    if _PROFILING_MODULES is None:
+        import cProfile
+        import pstats
+        _PROFILING_MODULES = (cProfile, pstats)
+    return _PROFILING_MODULES
+
+
+class _ExpiringCache:
+    """容量受限且按时间自动过期的缓存，按写入顺序淘汰最旧条目。"""
+
+    def __init__(self, ttl: float, maxsize: int = DEDUP_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def _prune(self, now: float):
+        # 条目按写入时间排序，从头部开始清理过期项即可
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            self._data.popitem(last=False)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        self._prune(now)
+        item = self._data.get(key)
+        return item[1] if item else None
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def set(self, key: Hashable, value: Any):
+        now = time.monotonic()
+        self._data.pop(key, None)
+        self._data[key] = (now + self.ttl, value)
+        self._prune(now)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class _LoopWatchdog:
+    """事件循环卡顿监测。插件处理期间由协程定期写入心跳，后台线程发现心跳超时后记录事件循环线程的调用栈。"""
+
+    def __init__(self, threshold_ms: int, interval: float = WATCHDOG_INTERVAL):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self._active = False
+        self._active_until = 0.0
+        self._reported = False
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._monitor_thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """开始监测，需在事件循环中调用。每次调用都会顺延自动停止的期限"""
+        self._loop_thread_id = threading.get_ident()
+        if not self._active:
+            self._last_beat = time.monotonic()
+        self._active_until = time.monotonic() + PIPELINE_TRACK_TIMEOUT
+        self._active = True
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        if self._monitor_thread is None:
+            self._monitor_thread = threading.Thread(target=self._monitor, name="magnet-preview-watchdog", daemon=True)
+            self._monitor_thread.start()
+
+    def pause(self):
+        """暂停监测，心跳协程会在下一次唤醒时退出"""
+        self._active = False
+
+    def stop(self):
+        self._active = False
+        self._stopped.set()
+        if self._heartbeat_task and not self._heartbeat_task.done():
+            self._heartbeat_task.cancel()
+
+    async def _heartbeat(self):
+        while self._active:
+            if time.monotonic() > self._active_until:
+                logger.warning("事件循环监测超过最长时限仍未结束，已自动暂停。")
+                self._active = False
+                break
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _monitor(self):
+        while not self._stopped.wait(self.interval):
+            if not self._active:
+                continue
+            # 心跳间隔内的正常休眠不计入阻塞时长
+            stalled = time.monotonic() - self._last_beat - self.interval
+            if stalled < self.threshold:
+                self._reported = False
+                continue
+            # 每次阻塞只采样一次调用栈，避免日志刷屏
+            if self._reported:
+                continue
+            self._reported = True
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "（无法获取调用栈）"
+            logger.warning(f"事件循环已阻塞 {stalled * 1000:.0f} ms（阈值 {self.threshold * 1000:.0f} ms），当前调用栈：\n{stack}")
+
+
+class MagnetResult:
+    """单条磁链的解析结果。信息行只生成一次，各平台所需文本按需渲染并缓存。"""
+
+    __slots__ = ("infos", "screenshots_urls", "_info_text", "_text", "_image_level", "_images")
+
+    def __init__(self, infos: List[str], screenshots_urls: Optional[List[str]] = None):
+        self.infos = infos
+        self.screenshots_urls = screenshots_urls or []
+        self._info_text: Optional[str] = None
+        self._text: Optional[str] = None
+        self._image_level: Optional[float] = None
+        self._images: Optional[List[bytes]] = None
+
+    def get_images(self, blur_level: Optional[float]) -> Optional[List[bytes]]:
+        """取出按指定模糊度处理过的截图，未缓存时返回 None"""
+        if self._images is not None and self._image_level == blur_level:
+            return self._images
+        return None
+
+    def set_images(self, blur_level: Optional[float], images: List[bytes]):
+        """缓存处理后的截图，只保留最近一种模糊度以限制内存"""
+        self._image_level = blur_level
+        self._images = images
+
+    @property
+    def info_text(self) -> str:
+        """仅包含解析信息的文本，用于图片模式与 Telegram 相册说明"""
+        if self._info_text is None:
+            self._info_text = "\n".join(self.infos)
+        return self._info_text
+
+    @property
+    def text(self) -> str:
+        """纯文本表示，包含截图链接"""
+        if self._text is None:
+            message = self.info_text
+            if self.screenshots_urls:
+                message += "\n\n📸 预览截图链接："
+                message += "".join(f"\n- 截图 {i+1}: {url}" for i, url in enumerate(self.screenshots_urls))
+            self._text = message
+        return self._text
+
+    def indexed_text(self, index: int, total: int) -> str:
+        """为多结果场景补齐统一标题，便于文本/直链回退复用。"""
+        if total > 1:
+            return f"🔗 磁链预览 #{index+1}\n\n" + self.text
+        return self.text
+
 
 class MagnetPreviewer(Star):
     
     def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
-        
+        init_started = time.perf_counter()
+
         self.output_as_link = config.get("output_as_link", False)
         self.max_screenshots = max(0, min(5, int(config.get("max_screenshot_count", 3))))
         self.cover_mosaic_level = float(config.get("cover_mosaic_level", 0.3))
@@ -40,17 +263,54 @@ class MagnetPreviewer(Star):
         self.enable_emoji_reaction = config.get("enable_emoji_reaction", True)
         self.mask_media_for_telegram = config.get("mask_media_for_telegram", False)
         self.session_whitelist = [str(sid) for sid in config.get("session_whitelist", [])]
+        self.dedup_window = max(0, int(config.get("dedup_window", 0)))
+        self.dedup_mode = str(config.get("dedup_mode", "reply")).lower()
+        if self.dedup_mode not in DEDUP_MODES:
+            self.dedup_mode = "reply"
+        # 自动解析去重：键为 (会话, InfoHash)，值为最近一次解析结果
+        self._recent_magnets = None
+        if self.dedup_window > 0:
+            cache_size = DEDUP_REPLAY_CACHE_SIZE if self.dedup_mode == "replay" else DEDUP_CACHE_SIZE
+            self._recent_magnets = _ExpiringCache(self.dedup_window, cache_size)
 
         self.whatslink_url = DEFAULT_WHATSLINK_URL
         self.api_url = f"{self.whatslink_url}/api/v1/link"
 
-        self._magnet_regex = re.compile(r"magnet:\?xt=urn:btih:([a-zA-Z0-9]{32,40})", re.IGNORECASE)
-        self._command_regex = re.compile(r"text='(.*?)'")
-        self._hash_regex = re.compile(r"\b([a-fA-F0-9]{40})\b", re.IGNORECASE)
-        self._url_regex = re.compile(r"\b(?:https?://|www\.)[^\s<>'\"`]+", re.IGNORECASE)
+        self._magnet_regex = MAGNET_REGEX
+        self._command_regex = COMMAND_REGEX
+        self._hash_regex = HASH_REGEX
+        self._url_regex = URL_REGEX
+
+        self._first_preview_logged = False
+
+        # 诊断：事件循环卡顿监测与按需性能分析
+        loop_lag_threshold = max(0, int(config.get("loop_lag_threshold_ms", 0)))
+        self._watchdog = _LoopWatchdog(loop_lag_threshold) if loop_lag_threshold > 0 else None
+        self._profiler = None
+        self._profile_task: Optional[asyncio.Task] = None
+        # 正在运行的处理流程：标识 -> 开始时间
+        self._active_pipelines: Dict[int, float] = {}
+        self._pipeline_ids = itertools.count()
+
+        self._log_startup_cost(time.perf_counter() - init_started)
+
+    @staticmethod
+    def _log_startup_cost(init_cost: float):
+        """插件加载完成时输出启动耗时；模块导入耗时仅在导入后的首个实例中输出"""
+        global _IMPORT_REPORTED
+        if _IMPORT_REPORTED:
+            logger.info(f"磁链预览插件加载完成: 初始化 {init_cost * 1000:.1f} ms")
+            return
+        _IMPORT_REPORTED = True
+        logger.info(f"磁链预览插件加载完成: 模块导入 {_IMPORT_COST * 1000:.1f} ms，初始化 {init_cost * 1000:.1f} ms")
 
-        
     async def terminate(self):
+        if self._watchdog:
+            self._watchdog.stop()
+        if self._profile_task and not self._profile_task.done():
+            self._profile_task.cancel()
+        self._set_profiler_enabled(False)
+        self._profiler = None
         logger.info("磁链预览插件已终止")
         await super().terminate()
 
@@ -59,7 +319,16 @@ class MagnetPreviewer(Star):
         """磁链解析指令，支持引用消息解析和直接输入"""
         if not self._is_allowed(event):
             return
-            
+
+        token = self._begin_tracking()
+        try:
+            async for result in self._run_magnet_cmd(event):
+                yield result
+        finally:
+            self._end_tracking(token)
+
+    async def _run_magnet_cmd(self, event: AstrMessageEvent) -> AsyncGenerator[Any, Any]:
+        """磁链指令的解析流程：提取目标文本、解析参数并展示结果"""
         full_msg = event.message_str.strip()
         parts = full_msg.split(maxsplit=1)
         arg = parts[1] if len(parts) > 1 else ""
@@ -127,7 +396,6 @@ class MagnetPreviewer(Star):
                                         json_str = seg_data.get("data")
                                         if json_str:
                                             try:
-                                                import json
                                                 data = json.loads(json_str)
                                                 news = data.get("meta", {}).get("detail", {}).get("news", [])
                                                 for n in news:
@@ -182,6 +450,145 @@ class MagnetPreviewer(Star):
         # 指令触发后阻止事件传播
         yield event.stop_event()
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("磁链性能", alias=["btprofile"])
+    async def profile_cmd(self, event: AstrMessageEvent):
+        """对预览流程进行限时性能分析，结束后回复耗时最多的函数（仅管理员）"""
+        if not self._is_allowed(event):
+            return
+
+        parts = event.message_str.strip().split()
+        duration = DEFAULT_PROFILE_SECONDS
+        if len(parts) > 1 and parts[1].isdigit():
+            duration = max(1, min(MAX_PROFILE_SECONDS, int(parts[1])))
+
+        if self._profiler is not None:
+            yield event.plain_result("⚠️ 性能分析正在进行中，请等待本轮结束。")
+            yield event.stop_event()
+            return
+
+        cProfile, _ = _load_profiling()
+        self._profiler = cProfile.Profile()
+        if self._active_pipelines:
+            self._set_profiler_enabled(True)
+        self._profile_task = asyncio.create_task(self._finish_profile(event.unified_msg_origin, duration))
+        yield event.plain_result(f"⏱️ 已开始分析预览流程，{duration} 秒后发送本插件函数的热点统计。")
+
+        # 指令触发后阻止事件传播
+        yield event.stop_event()
+
+    async def _finish_profile(self, umo: str, duration: int):
+        """等待分析时间结束后停止采集并发送统计结果"""
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            self._set_profiler_enabled(False)
+            profiler, self._profiler = self._profiler, None
+
+        report = self._format_profile_report(profiler)
+        try:
+            for part_text in self._split_text_by_length(report, 4000):
+                await self.context.send_message(umo, MessageChain([Plain(text=part_text)]))
+        except Exception as e:
+            logger.error(f"发送性能分析结果失败: {e}\n{report}")
+
+    @staticmethod
+    def _format_profile_report(profiler) -> str:
+        """仅统计本插件目录下的函数，按累计耗时排序输出前若干个热点"""
+        if profiler is None:
+            return "⚠️ 性能分析已中止。"
+        _, pstats = _load_profiling()
+        try:
+            stats = pstats.Stats(profiler)
+        except TypeError:
+            # 分析期间没有任何预览请求时没有统计数据
+            return "💡 分析期间没有预览请求，未采集到数据。"
+
+        # 分析器对整个线程生效，处理期间运行的其他插件、框架代码以及本插件的诊断代码在此排除
+        plugin_prefix = PLUGIN_DIR + os.sep
+        excluded = MagnetPreviewer._diagnostic_code_labels()
+        entries = [
+            (func, stat) for func, stat in stats.stats.items()
+            if func[0].startswith(plugin_prefix) and func not in excluded
+        ]
+        if not entries:
+            return "💡 分析期间没有预览请求，未采集到数据。"
+        entries.sort(key=lambda item: item[1][3], reverse=True)
+
+        lines = ["📊 本插件函数热点（按累计耗时排序，已排除其他插件、框架及诊断代码）："]
+        for (filename, lineno, func_name), (_, call_count, total_time, cumulative_time, _) in entries[:PROFILE_TOP_N]:
+            lines.append(
+                f"- {func_name} ({os.path.basename(filename)}:{lineno}) "
+                f"调用 {call_count} 次，自身 {total_time * 1000:.1f} ms，累计 {cumulative_time * 1000:.1f} ms"
+            )
+        return "\n".join(lines)
+
+    @staticmethod
+    def _diagnostic_code_labels() -> set:
+        """收集卡顿监测与性能分析相关函数（含内部推导式）在 cProfile 统计中的标识"""
+        funcs = [value for value in vars(_LoopWatchdog).values() if hasattr(value, "__code__")]
+        funcs += [
+            _load_profiling,
+            MagnetPreviewer.profile_cmd,
+            MagnetPreviewer._finish_profile,
+            MagnetPreviewer._format_profile_report,
+            MagnetPreviewer._diagnostic_code_labels,
+            MagnetPreviewer._set_profiler_enabled,
+            MagnetPreviewer._begin_tracking,
+            MagnetPreviewer._end_tracking,
+            MagnetPreviewer._prune_stale_tracking,
+            MagnetPreviewer._log_first_preview,
+        ]
+
+        labels = set()
+        codes = [func.__code__ for func in funcs if hasattr(func, "__code__")]
+        while codes:
+            code = codes.pop()
+            labels.add((code.co_filename, code.co_firstlineno, code.co_name))
+            codes.extend(const for const in code.co_consts if isinstance(const, type(code)))
+        return labels
+
+    def _set_profiler_enabled(self, enabled: bool):
+        """开启或关闭当前的性能分析器，与其他分析器冲突时放弃本次采集"""
+        if self._profiler is None:
+            return
+        try:
+            if enabled:
+                self._profiler.enable()
+            else:
+                self._profiler.disable()
+        except ValueError as e:
+            logger.warning(f"切换性能分析器状态失败: {e}")
+
+    def _begin_tracking(self) -> int:
+        """标记一次处理流程开始，首个流程进入时开启卡顿监测与性能分析"""
+        now = time.monotonic()
+        self._prune_stale_tracking(now)
+        token = next(self._pipeline_ids)
+        self._active_pipelines[token] = now
+        if self._watchdog:
+            self._watchdog.start()
+        if len(self._active_pipelines) == 1:
+            self._set_profiler_enabled(True)
+        return token
+
+    def _end_tracking(self, token: int):
+        """标记处理流程结束，最后一个流程退出时关闭卡顿监测与性能分析"""
+        self._active_pipelines.pop(token, None)
+        self._prune_stale_tracking(time.monotonic())
+        if not self._active_pipelines:
+            if self._watchdog:
+                self._watchdog.pause()
+            self._set_profiler_enabled(False)
+
+    def _prune_stale_tracking(self, now: float):
+        """清理超时仍未结束的流程记录（例如生成器被丢弃而未执行清理）"""
+        stale = [token for token, started in self._active_pipelines.items() if now - started > PIPELINE_TRACK_TIMEOUT]
+        for token in stale:
+            self._active_pipelines.pop(token, None)
+        if stale:
+            logger.warning(f"已清理 {len(stale)} 个超时未结束的磁链处理流程记录。")
+
     @filter.event_message_type(filter.EventMessageType.ALL)
     @filter.regex(r"(?is).*?magnet:\?xt=urn:btih:[a-zA-Z0-9]{32,40}.*")
     async def handle_magnet_regex(self, event: AstrMessageEvent) -> AsyncGenerator[Any, Any]:
@@ -197,6 +604,15 @@ class MagnetPreviewer(Star):
         if not self._is_allowed(event):
             return
 
+        token = self._begin_tracking()
+        try:
+            async for result in self._run_auto_parse(event):
+                yield result
+        finally:
+            self._end_tracking(token)
+
+    async def _run_auto_parse(self, event: AstrMessageEvent) -> AsyncGenerator[Any, Any]:
+        """自动解析流程：提取磁链、去重并展示结果"""
         plain_text = event.message_str
         # 自动解析模式仅处理显式磁链，避免误判普通 40 位哈希字符串
         links = self._extract_all_magnets(plain_text, include_bare_hash=False)[:self.max_magnet_count]
@@ -204,10 +620,22 @@ class MagnetPreviewer(Star):
         if not links:
             return
 
+        dedup_key = self._get_dedup_key(event)
+        reserved_links: List[str] = []
+        if dedup_key:
+            reserved_links = self._reserve_magnets(dedup_key, links)
+            if self.dedup_mode != "replay":
+                if not reserved_links:
+                    if self.dedup_mode == "reply":
+                        yield event.plain_result(f"💡 该磁链在 {self.dedup_window} 秒内已预览过，请查看上方结果。")
+                    yield event.stop_event()
+                    return
+                links = reserved_links
+
         # 自动触发时贴表情（仅QQ平台）
         await self._set_emoji(event, 339)
 
-        async for result in self._process_and_show_magnets(event, links):
+        async for result in self._process_and_show_magnets(event, links, dedup_key=dedup_key, reserved_links=reserved_links):
             yield result
 
         # 阻止事件继续传播，避免 LLM 等插件重复处理
@@ -228,6 +656,44 @@ class MagnetPreviewer(Star):
         return session_id in self.session_whitelist
 
 
+    def _get_dedup_key(self, event: AstrMessageEvent) -> Optional[str]:
+        """获取自动解析去重使用的会话标识，未启用去重时返回 None。"""
+        if self._recent_magnets is None:
+            return None
+        return getattr(event, "unified_msg_origin", "") or event.get_group_id() or event.get_sender_id() or None
+
+    def _reserve_magnets(self, dedup_key: str, links: List[str]) -> List[str]:
+        """为窗口内首次出现的磁链预占去重记录并返回这些磁链，解析完成前的重复消息也能被识别"""
+        loop = asyncio.get_running_loop()
+        reserved = []
+        for link in links:
+            cache_key = (dedup_key, self._get_info_hash(link))
+            if cache_key in self._recent_magnets:
+                continue
+            self._recent_magnets.set(cache_key, loop.create_future())
+            reserved.append(link)
+        return reserved
+
+    def _settle_magnet(self, cache_key: Tuple[str, str], magnet: Optional[MagnetResult]):
+        """结束预占：成功时写入解析结果，失败时移除记录以允许立即重试"""
+        entry = self._recent_magnets.get(cache_key)
+        if isinstance(entry, asyncio.Future):
+            if not entry.done():
+                entry.set_result(magnet)
+        elif magnet is None:
+            # 已有解析结果或记录已过期，无需处理
+            return
+
+        if magnet is None:
+            self._recent_magnets.pop(cache_key)
+        else:
+            self._recent_magnets.set(cache_key, magnet)
+
+    @staticmethod
+    def _get_info_hash(link: str) -> str:
+        """从标准化后的磁链中取出 InfoHash"""
+        return link.rsplit(":", 1)[-1].upper()
+
     def _get_platform_name(self, event: AstrMessageEvent) -> str:
         """获取平台名，优先事件方法，失败时回退 unified_msg_origin 前缀。"""
         try:
@@ -253,15 +719,18 @@ class MagnetPreviewer(Star):
     async def _send_telegram_album(
         self,
         event: AstrMessageEvent,
-        infos: List[str],
+        caption: str,
         image_bytes_list: List[bytes],
         has_spoiler: bool = False,
     ):
         """使用 Telegram Bot API 发送相册形式的消息"""
-        try:
-            from telegram import InputMediaPhoto
-            from telegram.ext import ExtBot
+        telegram_api = _load_telegram()
+        if telegram_api is None:
+            logger.warning("未安装 telegram 库，无法使用相册功能")
+            return False
+        InputMediaPhoto, ExtBot = telegram_api
 
+        try:
             tg_bot = getattr(event, 'client', None)
             if not tg_bot or not isinstance(tg_bot, ExtBot):
                 logger.warning("无法获取 Telegram Bot 实例，回退到普通发送方式")
@@ -278,7 +747,6 @@ class MagnetPreviewer(Star):
                 return False
 
             # 第一张图片带完整文本作为说明
-            caption = "\n".join(infos)
             if len(caption) > 1024:
                 caption = caption[:1020] + "..."
             media_group[0] = InputMediaPhoto(
@@ -294,9 +762,6 @@ class MagnetPreviewer(Star):
             )
             return True
 
-        except ImportError:
-            logger.warning("未安装 telegram 库，无法使用相册功能")
-            return False
         except Exception as e:
             logger.error(f"发送 Telegram 相册失败: {e}")
             return False
@@ -362,7 +827,6 @@ class MagnetPreviewer(Star):
 
         # 1. 如果内容是字符串（可能是 JSON 序列化后的）
         if isinstance(content, str):
-            import json
             try:
                 parsed = json.loads(content)
                 if isinstance(parsed, list):
@@ -393,22 +857,61 @@ class MagnetPreviewer(Star):
         
         return "".join(text_parts).strip()
 
-    async def _process_and_show_magnets(self, event: AstrMessageEvent, links: List[str], custom_blur: float = None) -> AsyncGenerator[Any, Any]:
+    async def _resolve_magnet(self, link: str, dedup_key: str = None, reserved: bool = False) -> MagnetResult:
+        """解析单条磁链；启用去重时记录结果，replay 模式下复用最近结果（含已处理的截图）"""
+        cache_key = (dedup_key, self._get_info_hash(link)) if dedup_key else None
+        if cache_key and not reserved:
+            cached = self._recent_magnets.get(cache_key)
+            # 同一磁链仍在解析中时等待其结果，避免重复请求
+            if isinstance(cached, asyncio.Future):
+                cached = await asyncio.shield(cached)
+            if cached is not None:
+                return cached
+
+        data = await self._fetch_magnet_info(link)
+        if not data or data.get('error'):
+            if cache_key and reserved:
+                self._settle_magnet(cache_key, None)
+            error_msg = data.get('name', '未知错误') if data else 'API无响应'
+            return MagnetResult([f"⚠️ 解析失败 ({link}): {error_msg.split('contact')[0].strip()}"])
+
+        magnet = MagnetResult(*self._sort_infos_and_get_urls(data))
+        if cache_key:
+            self._settle_magnet(cache_key, magnet)
+        return magnet
+
+    async def _process_and_show_magnets(self, event: AstrMessageEvent, links: List[str], custom_blur: float = None, dedup_key: str = None, reserved_links: List[str] = ()) -> AsyncGenerator[Any, Any]:
         """统一的磁链处理和展示流程"""
         all_results = []
-        for link in links:
-            data = await self._fetch_magnet_info(link)
-            
-            if not data or data.get('error'):
-                error_msg = data.get('name', '未知错误') if data else 'API无响应'
-                all_results.append(([f"⚠️ 解析失败 ({link}): {error_msg.split('contact')[0].strip()}"], []))
-            else:
-                infos, screenshots_urls = self._sort_infos_and_get_urls(data)
-                all_results.append((infos, screenshots_urls))
+        try:
+            for link in links:
+                all_results.append(await self._resolve_magnet(link, dedup_key, reserved=link in reserved_links))
+        finally:
+            # 中途取消时释放尚未完成的预占，避免等待方一直挂起
+            for link in reserved_links:
+                self._settle_magnet((dedup_key, self._get_info_hash(link)), None)
 
         if not all_results:
             return
 
+        render_started = time.perf_counter()
+        async for result in self._render_magnets(event, all_results, custom_blur):
+            yield result
+        self._log_first_preview(render_started)
+
+    def _log_first_preview(self, render_started: float):
+        """记录加载后首次预览的渲染耗时（不含 API 请求），用于评估冷启动"""
+        if self._first_preview_logged:
+            return
+        self._first_preview_logged = True
+        logger.info(
+            f"首次磁链预览渲染耗时: {(time.perf_counter() - render_started) * 1000:.1f} ms"
+            f"（Pillow 加载 {_PIL_LOAD_COST * 1000:.1f} ms）"
+        )
+
+    async def _render_magnets(self, event: AstrMessageEvent, all_results: List[MagnetResult], custom_blur: float = None) -> AsyncGenerator[Any, Any]:
+        """按平台生成解析结果的展示内容"""
+
         # Telegram 平台始终使用图片模式，忽略 output_as_link 配置
         if self._is_telegram_platform(event):
             async for result in self._generate_multi_forward_result(event, all_results, custom_blur):
@@ -416,11 +919,11 @@ class MagnetPreviewer(Star):
             return
 
         if len(all_results) == 1:
-            infos, screenshots_urls = all_results[0]
+            magnet = all_results[0]
             force_image_mode = custom_blur is not None
 
-            if (self.output_as_link and not force_image_mode) or not screenshots_urls:
-                yield event.plain_result(self._format_text_result(infos, screenshots_urls))
+            if (self.output_as_link and not force_image_mode) or not magnet.screenshots_urls:
+                yield event.plain_result(magnet.text)
             else:
                 async for result in self._generate_multi_forward_result(event, all_results, custom_blur):
                     yield result
@@ -449,32 +952,33 @@ class MagnetPreviewer(Star):
         except Exception as e:
             logger.debug(f"贴表情失败: {e}")
 
-    async def _generate_multi_forward_result(self, event: AstrMessageEvent, all_results: List[Tuple[List[str], List[str]]], custom_blur: float = None) -> AsyncGenerator[Any, Any]:
+    async def _generate_multi_forward_result(self, event: AstrMessageEvent, all_results: List[MagnetResult], custom_blur: float = None) -> AsyncGenerator[Any, Any]:
         """生成并发送合并转发消息，支持多个磁链结果（包含图片模式和直链模式）"""
         is_telegram = self._is_telegram_platform(event)
+        total_results = len(all_results)
 
         if is_telegram:
-            all_infos = []
+            caption_parts = []
             all_image_bytes = []
 
-            for i, (infos, screenshots_urls) in enumerate(all_results):
-                if len(all_results) > 1:
-                    all_infos.append(f"🔗 磁链预览 #{i+1}")
-                all_infos.extend(infos)
+            for i, magnet in enumerate(all_results):
+                if total_results > 1:
+                    caption_parts.append(f"🔗 磁链预览 #{i+1}")
+                caption_parts.append(magnet.info_text)
 
-                if screenshots_urls:
-                    image_bytes_list = await self._download_screenshots(screenshots_urls)
+                if magnet.screenshots_urls:
+                    image_bytes_list = await self._load_preview_images(magnet, None)
                     all_image_bytes.extend(image_bytes_list)
 
+            combined_text = "\n".join(caption_parts)
             if all_image_bytes:
                 # 使用 Telegram 原生 spoiler 功能
                 has_spoiler = self.mask_media_for_telegram
-                success = await self._send_telegram_album(event, all_infos, all_image_bytes, has_spoiler)
+                success = await self._send_telegram_album(event, combined_text, all_image_bytes, has_spoiler)
                 if success:
                     return
 
             # 如果相册发送失败，降级为文本输出
-            combined_text = "\n".join(all_infos)
             for part_text in self._split_text_by_length(combined_text, 4000):
                 if part_text:
                     yield event.plain_result(part_text)
@@ -485,9 +989,9 @@ class MagnetPreviewer(Star):
             platform_name = self._get_platform_name(event)
             logger.info(f"当前平台({platform_name})不支持合并转发，已降级为文本输出。")
             texts = []
-            for i, (infos, screenshots_urls) in enumerate(all_results):
-                res_text = self._format_text_result(infos, screenshots_urls)
-                if len(all_results) > 1:
+            for i, magnet in enumerate(all_results):
+                res_text = magnet.text
+                if total_results > 1:
                     res_text = f"磁链预览 #{i+1}\n\n" + res_text
                 texts.append(res_text)
             combined = ""
@@ -500,66 +1004,47 @@ class MagnetPreviewer(Star):
 
         sender_id = event.get_self_id()
         forward_nodes: List[Node] = []
-        link_forward_nodes: List[Node] = []
 
         # 如果指定了 custom_blur，强制使用图片模式
         force_image_mode = custom_blur is not None
+        link_mode = self.output_as_link and not force_image_mode
 
         try:
-            for i, (infos, screenshots_urls) in enumerate(all_results):
-                res_text = self._format_result_with_index(i, infos, screenshots_urls, len(all_results))
-                split_texts = self._split_text_by_length(res_text, 4000)
-                for part_text in split_texts:
-                    node_name = f"磁力预览信息 ({i+1})" if len(all_results) > 1 else "磁力预览信息"
-                    link_forward_nodes.append(Node(uin=sender_id, name=node_name, content=[Plain(text=part_text)]))
-
-                if self.output_as_link and not force_image_mode:
+            for i, magnet in enumerate(all_results):
+                node_suffix = f" ({i+1})" if total_results > 1 else ""
+
+                if link_mode:
                     # 1. 直链模式：直接将包含链接的文本作为节点
-                    for part_text in split_texts:
-                        node_name = f"磁力预览信息 ({i+1})" if len(all_results) > 1 else "磁力预览信息"
-                        forward_nodes.append(Node(uin=sender_id, name=node_name, content=[Plain(text=part_text)]))
+                    forward_nodes.extend(self._build_link_nodes(sender_id, i, magnet, total_results))
                 else:
                     # 2. 图片模式：下载图片并分节点展示
-                    image_bytes_list = await self._download_screenshots(screenshots_urls)
-
-                    display_infos = list(infos)
-                    if len(all_results) > 1:
-                        display_infos.insert(0, f"🔗 磁链预览 #{i+1}")
-
-                    if screenshots_urls:
-                        display_infos.append(f"\n📸 预览截图 (成功 {len(image_bytes_list)}/{len(screenshots_urls)} 张):")
-
-                    info_text = "\n".join(display_infos)
-                    split_texts = self._split_text_by_length(info_text, 4000)
+                    blur_level = custom_blur if custom_blur is not None else self.cover_mosaic_level
+                    image_bytes_list = await self._load_preview_images(magnet, blur_level)
 
-                    for j, part_text in enumerate(split_texts):
-                        node_name = "磁力预览信息"
-                        if len(all_results) > 1:
-                            node_name += f" ({i+1})"
-                        forward_nodes.append(Node(uin=sender_id, name=node_name, content=[Plain(text=part_text)]))
+                    info_text = magnet.info_text
+                    if total_results > 1:
+                        info_text = f"🔗 磁链预览 #{i+1}\n" + info_text
+                    if magnet.screenshots_urls:
+                        info_text += f"\n\n📸 预览截图 (成功 {len(image_bytes_list)}/{len(magnet.screenshots_urls)} 张):"
 
-                    blur_level = custom_blur if custom_blur is not None else self.cover_mosaic_level
+                    for part_text in self._split_text_by_length(info_text, 4000):
+                        forward_nodes.append(Node(uin=sender_id, name="磁力预览信息" + node_suffix, content=[Plain(text=part_text)]))
 
                     for img_bytes in image_bytes_list:
-                        if blur_level is not None:
-                            img_bytes = self._apply_mosaic(img_bytes, blur_level)
                         image_component = Comp.Image.fromBytes(img_bytes)
-                        node_name = "预览截图"
-                        if len(all_results) > 1:
-                            node_name += f" ({i+1})"
-                        forward_nodes.append(Node(uin=sender_id, name=node_name, content=[image_component]))
+                        forward_nodes.append(Node(uin=sender_id, name="预览截图" + node_suffix, content=[image_component]))
 
             if not forward_nodes:
                 yield event.plain_result("⚠️ 未能生成有效的预览内容。")
                 return
 
             merged_forward_message = Nodes(nodes=forward_nodes)
-            if self._is_aiocqhttp_platform(event) and not (self.output_as_link and not force_image_mode):
+            if self._is_aiocqhttp_platform(event) and not link_mode:
                 await event.send(MessageChain([merged_forward_message]))
                 return
         except Exception as e:
             logger.warning(f"图片模式发送失败，尝试回退到直链模式: {e}")
-            async for result in self._yield_link_fallback_results(event, link_forward_nodes, all_results):
+            async for result in self._yield_link_fallback_results(event, all_results):
                 yield result
             return
 
@@ -592,51 +1077,36 @@ class MagnetPreviewer(Star):
                     continue
         return base_info, screenshots_urls
 
-    def _format_text_result(self, infos: List[str], screenshots_urls: List[str]) -> str:
-        """生成纯文本回复，包含截图链接"""
-        message = "\n".join(infos)
-        
-        if screenshots_urls:
-            message += f"\n\n📸 预览截图链接："
-            for i, url in enumerate(screenshots_urls):
-                message += f"\n- 截图 {i+1}: {url}"
-                
-        return message
-
-    def _format_result_with_index(
-        self,
-        index: int,
-        infos: List[str],
-        screenshots_urls: List[str],
-        total_results: int,
-    ) -> str:
-        """为多结果场景补齐统一标题，便于文本/直链回退复用。"""
-        result_text = self._format_text_result(infos, screenshots_urls)
-        if total_results > 1:
-            result_text = f"🔗 磁链预览 #{index+1}\n\n" + result_text
-        return result_text
+    def _build_link_nodes(self, sender_id: str, index: int, magnet: MagnetResult, total_results: int) -> List[Node]:
+        """构建直链模式的合并转发节点"""
+        node_name = f"磁力预览信息 ({index+1})" if total_results > 1 else "磁力预览信息"
+        return [
+            Node(uin=sender_id, name=node_name, content=[Plain(text=part_text)])
+            for part_text in self._split_text_by_length(magnet.indexed_text(index, total_results), 4000)
+        ]
 
-    def _join_text_results(self, all_results: List[Tuple[List[str], List[str]]]) -> str:
+    def _join_text_results(self, all_results: List[MagnetResult]) -> str:
         """将多条结果拼接为纯文本，供最终兜底发送。"""
-        texts = []
         total_results = len(all_results)
-        for index, (infos, screenshots_urls) in enumerate(all_results):
-            texts.append(self._format_result_with_index(index, infos, screenshots_urls, total_results))
-        return "\n\n".join(texts)
+        return "\n\n".join(magnet.indexed_text(index, total_results) for index, magnet in enumerate(all_results))
 
     async def _yield_link_fallback_results(
         self,
         event: AstrMessageEvent,
-        link_forward_nodes: List[Node],
-        all_results: List[Tuple[List[str], List[str]]],
+        all_results: List[MagnetResult],
     ) -> AsyncGenerator[Any, Any]:
-        """统一处理直链重试和纯文本兜底。"""
-        if link_forward_nodes:
-            try:
+        """统一处理直链重试和纯文本兜底。直链节点仅在需要回退时构建。"""
+        try:
+            sender_id = event.get_self_id()
+            total_results = len(all_results)
+            link_forward_nodes: List[Node] = []
+            for index, magnet in enumerate(all_results):
+                link_forward_nodes.extend(self._build_link_nodes(sender_id, index, magnet, total_results))
+            if link_forward_nodes:
                 await event.send(MessageChain([Nodes(nodes=link_forward_nodes)]))
                 return
-            except Exception as retry_error:
-                logger.error(f"直链合并转发重试失败: {retry_error}")
+        except Exception as retry_error:
+            logger.error(f"直链合并转发重试失败: {retry_error}")
 
         combined = self._join_text_results(all_results)
         for part_text in self._split_text_by_length(combined, 4000):
@@ -665,6 +1135,20 @@ class MagnetPreviewer(Star):
             logger.error(f"An unexpected error occurred during fetch: {e}")
             return None
 
+    async def _load_preview_images(self, magnet: MagnetResult, blur_level: Optional[float]) -> List[bytes]:
+        """下载并按模糊度处理截图；replay 模式下完整下载的结果缓存在解析结果上以供复用"""
+        cached = magnet.get_images(blur_level)
+        if cached is not None:
+            return cached
+
+        image_bytes_list = await self._download_screenshots(magnet.screenshots_urls)
+        if blur_level is not None:
+            image_bytes_list = [self._apply_mosaic(img_bytes, blur_level) for img_bytes in image_bytes_list]
+        # 仅 replay 模式会再次读取截图，其他模式不保留以免去重缓存占用内存
+        if self._recent_magnets is not None and self.dedup_mode == "replay" and len(image_bytes_list) == len(magnet.screenshots_urls):
+            magnet.set_images(blur_level, image_bytes_list)
+        return image_bytes_list
+
     async def _download_screenshots(self, screenshots_urls: List[str]) -> List[bytes]:
         """下载截图并返回原始字节列表"""
         if not screenshots_urls:
@@ -693,6 +1177,7 @@ class MagnetPreviewer(Star):
             return image_data
 
         try:
+            Image, ImageFilter = _load_pil()
             with Image.open(BytesIO(image_data)) as img:
                 # 转换为 RGB，防止 RGBA 等格式保存为 JPEG 时出错
                 if img.mode != "RGB":